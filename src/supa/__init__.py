@@ -99,6 +99,8 @@ logging.config.dictConfig(
 )
 structlog.configure(
     processors=[
+        # drop log entries below the configured log level before running the other processors
+        structlog.stdlib.filter_by_level,
         structlog.stdlib.add_log_level,
         structlog.stdlib.add_logger_name,
         structlog.stdlib.PositionalArgumentsFormatter(),
@@ -35,29 +35,159 @@ The RSM and LSM MUST be instantiated as soon as the first Connection request is
 The PSM MUST be instantiated as soon as the first version of the reservation is committed.
 
 """
-from typing import Any
+from __future__ import annotations
+
+from functools import partial
+from typing import Any, Callable, ClassVar, Dict, List, Optional, Tuple, Type
 
 import structlog
-from statemachine import State, StateMachine
 from structlog.stdlib import BoundLogger
 
 logger = structlog.get_logger(__name__)
 
 
-class SuPAStateMachine(StateMachine):
-    """Add logging capabilities to StateMachine."""
+class TransitionNotAllowed(Exception):
+    """Event is not allowed in the current state of the state machine."""
 
-    log: BoundLogger
+    def __init__(self, event: str, state: State) -> None:
+        """Initialize TransitionNotAllowed with the offending event and current state."""
+        self.event = event
+        self.state = state
+        super().__init__(f"Can't {event} when in {state.name}.")
 
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
-        """Log name of finite state machine and call __init__ of super class with original arguments."""
-        self.log = logger.bind(fsm=self.__class__.__name__)
-        super().__init__(*args, **kwargs)
 
-    def on_enter_state(self, state: State) -> None:
-        """Statemachine will call this function on every state transition."""
-        if isinstance(state, State):
-            self.log.info("State transition", to_state=state.identifier, connection_id=str(self.model.connection_id))
+class State:
+    """State of a state machine.
+
+    The identifier of a state is the name of the class attribute it is assigned to.
+    """
+
+    name: str
+    value: str
+    initial: bool
+    identifier: str
+
+    def __init__(self, name: str, value: str, initial: bool = False) -> None:
+        """Initialize State with its name, value as stored in the database and whether it is the initial state."""
+        self.name = name
+        self.value = value
+        self.initial = initial
+        self.identifier = name
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        """Use the class attribute name as identifier."""
+        self.identifier = name
+
+    def __repr__(self) -> str:
+        """Return State in a human readable format."""
+        return f"State({self.name!r}, {self.value!r}, initial={self.initial!r})"
+
+    def to(self, destination: State) -> Event:
+        """Return event that transitions from this state to the destination state."""
+        return Event({self: destination})
+
+
+class Event:
+    """Event that transitions a state machine from one of the source states to its destination state.
+
+    Events from different source states are combined with ``|``,
+    eg. ``Held.to(Committing) | Timeout.to(Committing)``.
+    On a state machine instance an event is a method that fires the event.
+    """
+
+    transitions: Dict[State, State]
+    identifier: str
+
+    def __init__(self, transitions: Dict[State, State]) -> None:
+        """Initialize Event with mapping from source to destination state."""
+        self.transitions = transitions
+        self.identifier = ""
+
+    def __or__(self, other: Event) -> Event:
+        """Combine transitions of both events into one event."""
+        return Event({**self.transitions, **other.transitions})
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        """Use the class attribute name as identifier."""
+        self.identifier = name
+
+    def __get__(self, fsm: Optional[SuPAStateMachine], owner: type) -> Any:
+        """Return method that fires this event on the state machine, or the event itself on the class."""
+        if fsm is None:
+            return self
+        return partial(fsm.fire, self.identifier)
+
+
+def _is_in_state(state: State) -> Callable[[SuPAStateMachine], bool]:
+    """Return function that tells whether a state machine is in state."""
+
+    def is_in_state(fsm: SuPAStateMachine) -> bool:
+        return fsm.current_state is state
+
+    return is_in_state
+
+
+class SuPAStateMachine:
+    """Table driven state machine that stores its state on a field of a model.
+
+    On definition of a subclass all :class:`State`'s and :class:`Event`'s are collected
+    into a transition table that maps a (state value, event identifier) tuple to the destination state.
+    Firing an event is a single lookup in this table.
+    For every state a property ``is_<state identifier>`` is added
+    that tells whether the state machine is currently in that state,
+    subclasses declare these properties as ``bool`` annotations so type checkers know about them.
+    """
+
+    states: ClassVar[List[State]] = []
+    states_map: ClassVar[Dict[str, State]] = {}
+    transitions: ClassVar[Dict[Tuple[str, str], State]] = {}
+    initial_state: ClassVar[State]
+
+    log: BoundLogger
+    model: Any
+    state_field: str
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        """Build the transition table of the state machine."""
+        super().__init_subclass__(**kwargs)
+        cls.states = [attr for attr in vars(cls).values() if isinstance(attr, State)]
+        cls.states_map = {state.value: state for state in cls.states}
+        cls.transitions = {
+            (source.value, attr.identifier): destination
+            for attr in vars(cls).values()
+            if isinstance(attr, Event)
+            for source, destination in attr.transitions.items()
+        }
+        (cls.initial_state,) = [state for state in cls.states if state.initial]
+        for state in cls.states:
+            setattr(cls, f"is_{state.identifier}", property(_is_in_state(state)))
+
+    def __init__(self, model: Any, state_field: str = "state") -> None:
+        """Initialize state machine on model, setting the state field to the initial state if not yet set."""
+        self.log = logger.bind(fsm=self.__class__.__name__)
+        self.model = model
+        self.state_field = state_field
+        if getattr(model, state_field, None) is None:
+            setattr(model, state_field, self.initial_state.value)
+
+    @property
+    def current_state(self) -> State:
+        """Return current state of the state machine."""
+        return self.states_map[getattr(self.model, self.state_field)]
+
+    def fire(self, event: str) -> None:
+        """Transition the state machine to the destination state of event.
+
+        Raises:
+            TransitionNotAllowed: if the event is not allowed in the current state.
+        """
+        current_state = self.current_state
+        try:
+            destination = self.transitions[(current_state.value, event)]
+        except KeyError:
+            raise TransitionNotAllowed(event, current_state) from None
+        setattr(self.model, self.state_field, destination.value)
+        self.log.info("State transition", to_state=destination.identifier, connection_id=str(self.model.connection_id))
 
 
 class ReservationStateMachine(SuPAStateMachine):
@@ -66,13 +196,21 @@ class ReservationStateMachine(SuPAStateMachine):
     .. image:: /images/ReservationStateMachine.png
     """
 
-    ReserveStart = State("ReserveStart", "RESERVE_START", initial=True)
-    ReserveChecking = State("ReserveChecking", "RESERVE_CHECKING")
-    ReserveHeld = State("ReserveHeld", "RESERVE_HELD")
-    ReserveCommitting = State("ReserveCommitting", "RESERVE_COMMITTING")
-    ReserveFailed = State("ReserveFailed", "RESERVE_FAILED")
-    ReserveTimeout = State("ReserveTimeout", "RESERVE_TIMEOUT")
-    ReserveAborting = State("ReserveAborting", "RESERVE_ABORTING")
+    ReserveStart: State = State("ReserveStart", "RESERVE_START", initial=True)
+    ReserveChecking: State = State("ReserveChecking", "RESERVE_CHECKING")
+    ReserveHeld: State = State("ReserveHeld", "RESERVE_HELD")
+    ReserveCommitting: State = State("ReserveCommitting", "RESERVE_COMMITTING")
+    ReserveFailed: State = State("ReserveFailed", "RESERVE_FAILED")
+    ReserveTimeout: State = State("ReserveTimeout", "RESERVE_TIMEOUT")
+    ReserveAborting: State = State("ReserveAborting", "RESERVE_ABORTING")
+
+    is_ReserveStart: bool
+    is_ReserveChecking: bool
+    is_ReserveHeld: bool
+    is_ReserveCommitting: bool
+    is_ReserveFailed: bool
+    is_ReserveTimeout: bool
+    is_ReserveAborting: bool
 
     reserve_request = ReserveStart.to(ReserveChecking)
     reserve_confirmed = ReserveChecking.to(ReserveHeld)
@@ -93,10 +231,15 @@ class ProvisionStateMachine(SuPAStateMachine):
     .. image:: /images/ProvisionStateMachine.png
     """
 
-    Released = State("Released", "RELEASED", initial=True)
-    Provisioning = State("Provisioning", "PROVISIONING")
-    Provisioned = State("Provisioned", "PROVISIONED")
-    Releasing = State("Releasing", "RELEASING")
+    Released: State = State("Released", "RELEASED", initial=True)
+    Provisioning: State = State("Provisioning", "PROVISIONING")
+    Provisioned: State = State("Provisioned", "PROVISIONED")
+    Releasing: State = State("Releasing", "RELEASING")
+
+    is_Released: bool
+    is_Provisioning: bool
+    is_Provisioned: bool
+    is_Releasing: bool
 
     provision_request = Released.to(Provisioning)
     provision_confirmed = Provisioning.to(Provisioned)
@@ -110,11 +253,17 @@ class LifecycleStateMachine(SuPAStateMachine):
     .. image:: /images/LifecycleStateMachine.png
     """
 
-    Created = State("Created", "CREATED", initial=True)
-    Failed = State("Failed", "FAILED")
-    Terminating = State("Terminating", "TERMINATING")
-    PassedEndTime = State("PassedEndTime", "PASSED_END_TIME")
-    Terminated = State("Terminated", "TERMINATED")
+    Created: State = State("Created", "CREATED", initial=True)
+    Failed: State = State("Failed", "FAILED")
+    Terminating: State = State("Terminating", "TERMINATING")
+    PassedEndTime: State = State("PassedEndTime", "PASSED_END_TIME")
+    Terminated: State = State("Terminated", "TERMINATED")
+
+    is_Created: bool
+    is_Failed: bool
+    is_Terminating: bool
+    is_PassedEndTime: bool
+    is_Terminated: bool
 
     forced_end_notification = Created.to(Failed)
     terminate_request = Created.to(Terminating) | PassedEndTime.to(Terminating) | Failed.to(Terminating)
@@ -128,14 +277,23 @@ class DataPlaneStateMachine(SuPAStateMachine):
     .. image:: /images/DataPlaneStateMachine.png
     """
 
-    Deactivated = State("Deactivated", "DEACTIVATED", initial=True)
-    AutoStart = State("AutoStart", "AUTO_START")
-    Activating = State("Activating", "ACTIVATING")
-    Activated = State("Activated", "ACTIVATED")
-    AutoEnd = State("AutoEnd", "AUTO_END")
-    Deactivating = State("Deactivating", "DEACTIVATING")
-    ActivateFailed = State("ActivateFailed", "ACTIVATE_FAILED")
-    DeactivateFailed = State("DeactivateFailed", "DEACTIVATE_FAILED")
+    Deactivated: State = State("Deactivated", "DEACTIVATED", initial=True)
+    AutoStart: State = State("AutoStart", "AUTO_START")
+    Activating: State = State("Activating", "ACTIVATING")
+    Activated: State = State("Activated", "ACTIVATED")
+    AutoEnd: State = State("AutoEnd", "AUTO_END")
+    Deactivating: State = State("Deactivating", "DEACTIVATING")
+    ActivateFailed: State = State("ActivateFailed", "ACTIVATE_FAILED")
+    DeactivateFailed: State = State("DeactivateFailed", "DEACTIVATE_FAILED")
+
+    is_Deactivated: bool
+    is_AutoStart: bool
+    is_Activating: bool
+    is_Activated: bool
+    is_AutoEnd: bool
+    is_Deactivating: bool
+    is_ActivateFailed: bool
+    is_DeactivateFailed: bool
 
     auto_start_request = Deactivated.to(AutoStart)
     activate_request = Deactivated.to(Activating) | AutoStart.to(Activating)
@@ -163,15 +321,14 @@ if __name__ == "__main__":  # pragma: no cover
 
     output_path = get_project_root() / "docs" / "images"
 
-    def plot_fsm(fsm: StateMachine, name: str) -> None:
+    def plot_fsm(fsm: Type[SuPAStateMachine], name: str) -> None:
         """Generate image that visualizes a state machine."""
         dg = Digraph(name=name, comment=name)
-        for s in fsm.states:
-            for t in s.transitions:
-                dg.edge(t.source.value, t.destinations[0].value, label=t.identifier)
+        for (source, event), destination in fsm.transitions.items():
+            dg.edge(source, destination.value, label=event)
         dg.render(filename=name, directory=output_path, cleanup=True, format="png")
 
-    plot_fsm(ReservationStateMachine(), "ReservationStateMachine")
-    plot_fsm(ProvisionStateMachine(), "ProvisionStateMachine")
-    plot_fsm(LifecycleStateMachine(), "LifecycleStateMachine")
-    plot_fsm(DataPlaneStateMachine(), "DataPlaneStateMachine")
+    plot_fsm(ReservationStateMachine, "ReservationStateMachine")
+    plot_fsm(ProvisionStateMachine, "ProvisionStateMachine")
+    plot_fsm(LifecycleStateMachine, "LifecycleStateMachine")
+    plot_fsm(DataPlaneStateMachine, "DataPlaneStateMachine")
@@ -18,7 +18,6 @@ from uuid import UUID
 
 import structlog
 from grpc import ServicerContext
-from statemachine.exceptions import TransitionNotAllowed
 
 from supa import settings
 from supa.connection.error import (
@@ -28,7 +27,12 @@ from supa.connection.error import (
     UnsupportedParameter,
     Variable,
 )
-from supa.connection.fsm import LifecycleStateMachine, ProvisionStateMachine, ReservationStateMachine
+from supa.connection.fsm import (
+    LifecycleStateMachine,
+    ProvisionStateMachine,
+    ReservationStateMachine,
+    TransitionNotAllowed,
+)
 from supa.db import model
 from supa.db.model import Request
 from supa.grpc_nsi import connection_provider_pb2_grpc
@@ -218,7 +218,7 @@ class Reservation(Base):
         return result[-1][0]
 
     # request message (+ connection_id)
-    global_reservation_id = Column(Text, nullable=False)
+    global_reservation_id = Column(Text, nullable=False, index=True)
     description = Column(Text)
 
     # reservation request criteria
@@ -67,7 +67,7 @@ Example topology document::
     </ns3:Topology>
 """
 from datetime import datetime, timedelta
-from typing import Union
+from typing import Dict, Union
 
 import cherrypy
 import structlog
@@ -130,15 +130,16 @@ def refresh_topology() -> None:
         refresh_topology_lock.release()
         log.warning("refresh topology lock", state="released after exception")
         raise exception
-    nrm_stp_ids = [nrm_stp.stp_id for nrm_stp in nrm_stps]
+    nrm_stp_ids = {nrm_stp.stp_id for nrm_stp in nrm_stps}
 
     with db_session() as session:
+        # load all known STP's at once instead of querying the database for every STP from the NRM
+        stps: Dict[str, Topology] = {stp.stp_id: stp for stp in session.query(Topology)}
         for nrm_stp in nrm_stps:
             if nrm_stp.topology != settings.topology:
                 log.debug("skip STP with unknown topology", stp=nrm_stp.stp_id, topology=nrm_stp.topology)
             else:
-                stp = session.query(Topology).filter(Topology.stp_id == nrm_stp.stp_id).one_or_none()
-                if stp:
+                if stp := stps.get(nrm_stp.stp_id):
                     log.debug(
                         "update existing STP", stp_id=nrm_stp.stp_id, port_id=nrm_stp.port_id, vlans=nrm_stp.vlans
                     )
@@ -151,20 +152,20 @@ def refresh_topology() -> None:
                     stp.enabled = nrm_stp.enabled
                 else:
                     log.info("add new STP", stp_id=nrm_stp.stp_id, port_id=nrm_stp.port_id, vlans=nrm_stp.vlans)
-                    session.add(
-                        Topology(
-                            stp_id=nrm_stp.stp_id,
-                            port_id=nrm_stp.port_id,
-                            vlans=nrm_stp.vlans,
-                            description=nrm_stp.description,
-                            is_alias_in=nrm_stp.is_alias_in,
-                            is_alias_out=nrm_stp.is_alias_out,
-                            bandwidth=nrm_stp.bandwidth,
-                            enabled=nrm_stp.enabled,
-                        )
+                    stps[nrm_stp.stp_id] = Topology(
+                        stp_id=nrm_stp.stp_id,
+                        port_id=nrm_stp.port_id,
+                        vlans=nrm_stp.vlans,
+                        description=nrm_stp.description,
+                        is_alias_in=nrm_stp.is_alias_in,
+                        is_alias_out=nrm_stp.is_alias_out,
+                        bandwidth=nrm_stp.bandwidth,
+                        enabled=nrm_stp.enabled,
                     )
-        for stp in session.query(Topology).filter(Topology.enabled):
-            if stp.stp_id not in nrm_stp_ids:
+                    # a later NRM STP with the same STP ID updates this one instead of adding a duplicate
+                    session.add(stps[nrm_stp.stp_id])
+        for stp in stps.values():
+            if stp.enabled and stp.stp_id not in nrm_stp_ids:
                 log.info("disable vanished STP", stp_id=stp.stp_id, port_id=stp.port_id, vlans=stp.vlans)
                 stp.enabled = False
     last_refresh = now
@@ -18,12 +18,11 @@ from uuid import UUID
 import structlog
 from apscheduler.triggers.date import DateTrigger
 from more_itertools import flatten
-from statemachine.exceptions import TransitionNotAllowed
 from structlog.stdlib import BoundLogger
 
 from supa.connection import requester
 from supa.connection.error import GenericInternalError, Variable
-from supa.connection.fsm import DataPlaneStateMachine, LifecycleStateMachine
+from supa.connection.fsm import DataPlaneStateMachine, LifecycleStateMachine, TransitionNotAllowed
 from supa.db.model import Connection, Reservation, connection_to_dict
 from supa.grpc_nsi.connection_requester_pb2 import ErrorRequest, GenericConfirmedRequest
 from supa.job.dataplane import AutoEndJob, AutoStartJob, DeactivateJob
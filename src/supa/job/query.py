@@ -12,32 +12,24 @@
 #  limitations under the License.
 from __future__ import annotations
 
-from typing import List, Type
+from datetime import datetime
+from typing import ClassVar, Dict, List, Optional, Type
 from uuid import UUID
 
 import structlog
 from apscheduler.triggers.date import DateTrigger
 from sqlalchemy import func, or_
+from sqlalchemy.orm import selectinload
 from structlog.stdlib import BoundLogger
 
 from supa.connection import requester
 from supa.connection.fsm import DataPlaneStateMachine, ReservationStateMachine
 from supa.db.model import Notification, Reservation, Result
-from supa.grpc_nsi.connection_common_pb2 import Header
 from supa.grpc_nsi.connection_provider_pb2 import QueryNotificationRequest, QueryRequest, QueryResultRequest
 from supa.grpc_nsi.connection_requester_pb2 import (
-    DataPlaneStateChangeRequest,
-    ErrorEventRequest,
-    ErrorRequest,
-    GenericConfirmedRequest,
-    GenericFailedRequest,
-    MessageDeliveryTimeoutRequest,
     QueryConfirmedRequest,
     QueryNotificationConfirmedRequest,
-    QueryResult,
     QueryResultConfirmedRequest,
-    ReserveConfirmedRequest,
-    ReserveTimeoutRequest,
     ResultResponse,
 )
 from supa.job.shared import Job
@@ -47,56 +39,85 @@ from supa.util.type import NotificationType, ResultType
 
 logger = structlog.get_logger(__name__)
 
+# Reservations in these states are never part of a query result.
+_EXCLUDED_RESERVATION_STATES = frozenset(
+    {ReservationStateMachine.ReserveChecking.value, ReservationStateMachine.ReserveFailed.value}
+)
+# The data plane of reservations in these states is reported as being active.
+_ACTIVE_DATA_PLANE_STATES = frozenset({DataPlaneStateMachine.Activated.value, DataPlaneStateMachine.AutoEnd.value})
+
+# Map the stored notification type to the name of the field of the QueryNotificationConfirmedRequest it is added to.
+_NOTIFICATION_FIELDS: Dict[str, str] = {
+    NotificationType.ReserveTimeout.value: "reserve_timeout",
+    NotificationType.ErrorEvent.value: "error_event",
+    NotificationType.MessageDeliveryTimeout.value: "message_delivery_timeout",
+    NotificationType.DataPlaneStateChange.value: "data_plane_state_change",
+}
+
 
 def create_query_confirmed_request(
     pb_query_request: QueryRequest,
+    if_modified_since: Optional[datetime] = None,
 ) -> QueryConfirmedRequest:
     """Create a list of reservation information matching the request.
 
     Args:
         pb_query_request: Query request with match criteria.
+        if_modified_since: Already converted if modified since timestamp of the query request, if available.
 
     Returns:
         List of reservation information.
     """
     from supa.db.session import db_session
 
+    if if_modified_since is None:
+        if_modified_since = as_utc_timestamp(pb_query_request.if_modified_since)
+
     with db_session() as session:
         or_filter = []
         if pb_query_request.connection_id:
-            or_filter += [
-                Reservation.connection_id == UUID(str(connection_id))
-                for connection_id in pb_query_request.connection_id
-            ]
+            or_filter.append(
+                Reservation.connection_id.in_([UUID(connection_id) for connection_id in pb_query_request.connection_id])
+            )
         if pb_query_request.global_reservation_id:
-            or_filter += [
-                Reservation.global_reservation_id == global_reservation_id
-                for global_reservation_id in pb_query_request.global_reservation_id
-            ]
-        reservations: List[Reservation] = (
-            session.query(Reservation)
-            .filter(or_(*or_filter))
-            .filter(Reservation.reservation_state != ReservationStateMachine.ReserveChecking.value)
-            .filter(Reservation.reservation_state != ReservationStateMachine.ReserveFailed.value)
-            .filter(Reservation.last_modified > as_utc_timestamp(pb_query_request.if_modified_since))
+            or_filter.append(Reservation.global_reservation_id.in_(list(pb_query_request.global_reservation_id)))
+        reservation_query = session.query(Reservation).options(selectinload(Reservation.parameters))
+        if or_filter:  # without any connection or global reservation ID all reservations are returned
+            reservation_query = reservation_query.filter(or_(*or_filter))
+        reservation_query = reservation_query.filter(
+            Reservation.reservation_state.notin_(_EXCLUDED_RESERVATION_STATES)
+        ).filter(Reservation.last_modified > if_modified_since)
+        last_modified = session.query(func.max(Reservation.last_modified)).scalar()
+
+        # lookup the highest notification and result ID of all matching reservations at once,
+        # instead of querying the database for every reservation separately
+        connection_ids = reservation_query.with_entities(Reservation.connection_id).subquery()
+        max_notification_ids: Dict[UUID, int] = dict(
+            session.query(Notification.connection_id, func.max(Notification.notification_id))
+            .filter(Notification.connection_id.in_(connection_ids))
+            .group_by(Notification.connection_id)
+            .all()
+        )
+        max_result_ids: Dict[UUID, int] = dict(
+            session.query(Result.connection_id, func.max(Result.result_id))
+            .filter(Result.connection_id.in_(connection_ids))
+            .group_by(Result.connection_id)
             .all()
         )
-        last_modified = session.query(func.max(Reservation.last_modified)).scalar()
 
-        header = Header()
-        header.CopyFrom(pb_query_request.header)
-        request = QueryConfirmedRequest(header=header)
+        request = QueryConfirmedRequest(header=pb_query_request.header)
         if last_modified:  # equals None if there are no reservations yet
             request.last_modified.FromDatetime(last_modified)
-        for reservation in reservations:
-            query_result = QueryResult()
+        # stream reservations instead of loading them all in memory before building the query results,
+        # and build each query result in place in the request instead of copying it in afterwards
+        for reservation in reservation_query.yield_per(200):
+            query_result = request.reservation.add()
             query_result.connection_id = str(reservation.connection_id)
             query_result.requester_nsa = reservation.requester_nsa
             query_result.connection_states.CopyFrom(
                 to_connection_states(
                     reservation,
-                    data_plane_active=reservation.data_plane_state
-                    in (DataPlaneStateMachine.Activated.value, DataPlaneStateMachine.AutoEnd.value),
+                    data_plane_active=reservation.data_plane_state in _ACTIVE_DATA_PLANE_STATES,
                 )
             )
             if reservation.global_reservation_id:
@@ -105,16 +126,8 @@ def create_query_confirmed_request(
                 query_result.description = reservation.description
             # TODO: when Modify Reservation is implemented, add all criteria
             query_result.criteria.append(to_criteria(reservation))
-            # TODO: implement notification_id and result_id
-            max_notification_id = session.query(
-                func.max(Notification.notification_id).filter(Notification.connection_id == reservation.connection_id)
-            ).scalar()
-            query_result.notification_id = max_notification_id if max_notification_id else 0
-            max_result_id = session.query(
-                func.max(Result.result_id).filter(Result.connection_id == reservation.connection_id)
-            ).scalar()
-            query_result.result_id = max_result_id if max_result_id else 0
-            request.reservation.append(query_result)
+            query_result.notification_id = max_notification_ids.get(reservation.connection_id, 0)
+            query_result.result_id = max_result_ids.get(reservation.connection_id, 0)
 
         return request
 
@@ -136,33 +149,27 @@ def create_query_notification_confirmed_request(
     from supa.db.session import db_session
 
     with db_session() as session:
-        query = session.query(Notification).filter(
+        # only the type and serialized data are needed, no need to load complete Notification objects
+        query = session.query(Notification.notification_type, Notification.notification_data).filter(
             Notification.connection_id == UUID(pb_query_notification_request.connection_id)
         )
         if pb_query_notification_request.start_notification_id > 0:
             query = query.filter(Notification.notification_id >= pb_query_notification_request.start_notification_id)
         if pb_query_notification_request.end_notification_id > 0:
             query = query.filter(Notification.notification_id <= pb_query_notification_request.end_notification_id)
-        notifications: List[Notification] = query.all()
-
-        header = Header()
-        header.CopyFrom(pb_query_notification_request.header)
-        request = QueryNotificationConfirmedRequest(header=header)
-        for notification in notifications:
-            if notification.notification_type == NotificationType.ReserveTimeout.value:
-                request.reserve_timeout.append(ReserveTimeoutRequest().FromString(notification.notification_data))
-            elif notification.notification_type == NotificationType.ErrorEvent.value:
-                request.error_event.append(ErrorEventRequest().FromString(notification.notification_data))
-            elif notification.notification_type == NotificationType.MessageDeliveryTimeout.value:
-                request.message_delivery_timeout.append(
-                    MessageDeliveryTimeoutRequest().FromString(notification.notification_data)
-                )
-            elif notification.notification_type == NotificationType.DataPlaneStateChange.value:
-                request.data_plane_state_change.append(
-                    DataPlaneStateChangeRequest().FromString(notification.notification_data)
-                )
-            else:
-                logger.error("unknown notification type: %s" % notification.notification_type)
+
+        request = QueryNotificationConfirmedRequest(header=pb_query_notification_request.header)
+        # lookup the add method of the repeated field for every notification type once, instead of per notification
+        add_notification = {
+            notification_type: getattr(request, field_name).add
+            for notification_type, field_name in _NOTIFICATION_FIELDS.items()
+        }
+        for notification_type, notification_data in query.yield_per(500):
+            if (add := add_notification.get(notification_type)) is None:
+                logger.error("unknown notification type: %s" % notification_type)
+                continue
+            # parse straight into a new element of the repeated field, instead of copying a parsed message into it
+            add().ParseFromString(notification_data)
 
         return request
 
@@ -191,32 +198,30 @@ def create_query_result_confirmed_request(
             query = query.filter(Result.result_id <= pb_query_result_request.end_result_id)
         results: List[Result] = query.all()
 
-        header = Header()
-        header.CopyFrom(pb_query_result_request.header)
-        request = QueryResultConfirmedRequest(header=header)
+        request = QueryResultConfirmedRequest(header=pb_query_result_request.header)
         for result in results:
             rr = ResultResponse()
             rr.result_id = result.result_id
             rr.correlation_id = result.correlation_id.urn
             rr.time_stamp.FromDatetime(result.timestamp)
             if result.result_type == ResultType.ReserveConfirmed.value:
-                rr.reserve_confirmed.CopyFrom(ReserveConfirmedRequest().FromString(result.result_data))
+                rr.reserve_confirmed.ParseFromString(result.result_data)
             elif result.result_type == ResultType.ReserveFailed.value:
-                rr.reserve_failed.CopyFrom(GenericFailedRequest().FromString(result.result_data))
+                rr.reserve_failed.ParseFromString(result.result_data)
             elif result.result_type == ResultType.ReserveCommitConfirmed.value:
-                rr.reserve_commit_confirmed.CopyFrom(GenericConfirmedRequest().FromString(result.result_data))
+                rr.reserve_commit_confirmed.ParseFromString(result.result_data)
             elif result.result_type == ResultType.ReserveCommitFailed.value:
-                rr.reserve_commit_failed.CopyFrom(GenericFailedRequest().FromString(result.result_data))
+                rr.reserve_commit_failed.ParseFromString(result.result_data)
             elif result.result_type == ResultType.ReserveAbortConfirmed.value:
-                rr.reserve_abort_confirmed.CopyFrom(GenericConfirmedRequest().FromString(result.result_data))
+                rr.reserve_abort_confirmed.ParseFromString(result.result_data)
             elif result.result_type == ResultType.ProvisionConfirmed.value:
-                rr.provision_confirmed.CopyFrom(GenericConfirmedRequest().FromString(result.result_data))
+                rr.provision_confirmed.ParseFromString(result.result_data)
             elif result.result_type == ResultType.ReleaseConfirmed.value:
-                rr.release_confirmed.CopyFrom(GenericConfirmedRequest().FromString(result.result_data))
+                rr.release_confirmed.ParseFromString(result.result_data)
             elif result.result_type == ResultType.TerminateConfirmed.value:
-                rr.terminate_confirmed.CopyFrom(GenericConfirmedRequest().FromString(result.result_data))
+                rr.terminate_confirmed.ParseFromString(result.result_data)
             elif result.result_type == ResultType.Error.value:
-                rr.error.CopyFrom(ErrorRequest().FromString(result.result_data))
+                rr.error.ParseFromString(result.result_data)
             else:
                 logger.error("unknown result type: %s" % result.result_type)
             request.result.append(rr)
@@ -224,14 +229,23 @@ def create_query_result_confirmed_request(
         return request
 
 
-class QuerySummaryJob(Job):
-    """Handle query summary requests."""
+class QueryJob(Job):
+    """Handle query summary and query recursive requests.
+
+    Both only differ in the requester method that is called with the query result,
+    which is set by the subclasses.
+    """
 
     log: BoundLogger
     pb_query_request: QueryRequest
+    if_modified_since: datetime
+    description: ClassVar[str]
+    """Description of the query used in logging."""
+    method: ClassVar[str]
+    """Name of the requester stub method that is called with the query confirmed request."""
 
     def __init__(self, pb_query_request: QueryRequest):
-        """Initialize the QuerySummaryJob.
+        """Initialize the QueryJob.
 
         Args:
            pb_query_request: protobuf query request message
@@ -254,40 +268,41 @@ class QuerySummaryJob(Job):
                 globalReservationId) if the reservation has been created, modified, or
                 has undergone a change since the specified ifModifiedSince time.
         """
+        self.if_modified_since = as_utc_timestamp(pb_query_request.if_modified_since)
         self.log = logger.bind(
-            job="QuerySummaryJob",
+            job=self.__class__.__name__,
             connection_ids=pb_query_request.connection_id,
             global_reservation_ids=pb_query_request.global_reservation_id,
-            if_modified_since=as_utc_timestamp(pb_query_request.if_modified_since).isoformat(),
+            if_modified_since=self.if_modified_since.isoformat(),
         )
         self.pb_query_request = pb_query_request
 
     def __call__(self) -> None:
-        """Query summary request.
+        """Query request.
 
-        Query summary listing reservations matching the optional connection id(s),
+        Query listing reservations matching the optional connection id(s),
         global reservation id(s) and if modified since timestamp.
         """
-        self.log.info("Query summary")
-        request = create_query_confirmed_request(self.pb_query_request)
+        self.log.info(self.description)
+        request = create_query_confirmed_request(self.pb_query_request, self.if_modified_since)
         stub = requester.get_stub()
-        self.log.debug("Sending message", method="QuerySummaryConfirmed", request_message=request)
-        stub.QuerySummaryConfirmed(request)
+        self.log.debug("Sending message", method=self.method, request_message=request)
+        getattr(stub, self.method)(request)
 
     @classmethod
-    def recover(cls: Type[QuerySummaryJob]) -> List[Job]:
-        """Recover QuerySummaryJob's that did not get to run before SuPA was terminated.
+    def recover(cls: Type[QueryJob]) -> List[Job]:
+        """Recover query jobs that did not get to run before SuPA was terminated.
 
-        As no query summary request details are stored in the database (at this time),
-        it is not possible to recover QuerySummaryJob's.
+        As no query request details are stored in the database (at this time),
+        it is not possible to recover query jobs.
 
         Returns:
-            List of QuerySummaryJob's that still need to be run (currently always empty List).
+            List of query jobs that still need to be run (currently always empty List).
         """
         return []
 
     def trigger(self) -> DateTrigger:
-        """Trigger for QuerySummaryJob's.
+        """Trigger for query jobs.
 
         Returns:
             DateTrigger set to None, which means run now.
@@ -295,75 +310,18 @@ class QuerySummaryJob(Job):
         return DateTrigger(run_date=None)  # Run immediately
 
 
-class QueryRecursiveJob(Job):
-    """Handle query recursive requests."""
-
-    log: BoundLogger
-    pb_query_request: QueryRequest
-
-    def __init__(self, pb_query_request: QueryRequest):
-        """Initialize the QueryRecursiveJob.
-
-        Args:
-           pb_query_request: protobuf query request message
-
-                Elements compose a filter for specifying the reservations to return
-                in response to the query operation. Supports the querying of reservations
-                based on connectionId or globalReservationId. Filter items specified
-                are OR'ed to build the match criteria. If no criteria are specified
-                then all reservations associated with the requesting NSA are returned.
-
-                Elements:
-
-                connectionId - Return reservations containing this connectionId.
-
-                globalReservationId - Return reservations containing this globalReservationId.
-
-                ifModifiedSince - If an NSA receives a querySummary or querySummarySync
-                message containing this element, then the NSA only returns those
-                reservations matching the filter elements (connectionId,
-                globalReservationId) if the reservation has been created, modified, or
-                has undergone a change since the specified ifModifiedSince time.
-        """
-        self.log = logger.bind(
-            job="QueryRecursiveJob",
-            connection_ids=pb_query_request.connection_id,
-            global_reservation_ids=pb_query_request.global_reservation_id,
-            if_modified_since=as_utc_timestamp(pb_query_request.if_modified_since).isoformat(),
-        )
-        self.pb_query_request = pb_query_request
-
-    def __call__(self) -> None:
-        """Query recursive request.
-
-        Query recursive listing reservations matching the optional connection id(s),
-        global reservation id(s) and if modified since timestamp.
-        """
-        self.log.info("Query recursive")
-        request = create_query_confirmed_request(self.pb_query_request)
-        stub = requester.get_stub()
-        self.log.debug("Sending message", method="QueryRecursiveConfirmed", request_message=request)
-        stub.QueryRecursiveConfirmed(request)
+class QuerySummaryJob(QueryJob):
+    """Handle query summary requests."""
 
-    @classmethod
-    def recover(cls: Type[QueryRecursiveJob]) -> List[Job]:
-        """Recover QueryRecursiveJob's that did not get to run before SuPA was terminated.
+    description = "Query summary"
+    method = "QuerySummaryConfirmed"
 
-        As no query recursive request details are stored in the database (at this time),
-        it is not possible to recover QueryRecursiveJob's.
 
-        Returns:
-            List of QueryRecursiveJob's that still need to be run (currently always empty List).
-        """
-        return []
-
-    def trigger(self) -> DateTrigger:
-        """Trigger for QueryRecursiveJob's.
+class QueryRecursiveJob(QueryJob):
+    """Handle query recursive requests."""
 
-        Returns:
-            DateTrigger set to None, which means run now.
-        """
-        return DateTrigger(run_date=None)  # Run immediately
+    description = "Query recursive"
+    method = "QueryRecursiveConfirmed"
 
 
 class QueryNotificationJob(Job):
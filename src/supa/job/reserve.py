@@ -24,7 +24,6 @@ from apscheduler.triggers.date import DateTrigger
 from more_itertools import flatten
 from sqlalchemy import and_, func, or_, orm
 from sqlalchemy.orm import aliased, joinedload
-from statemachine.exceptions import TransitionNotAllowed
 from structlog.stdlib import BoundLogger
 
 from supa import settings
@@ -38,7 +37,12 @@ from supa.connection.error import (
     UnknownStp,
     Variable,
 )
-from supa.connection.fsm import LifecycleStateMachine, ProvisionStateMachine, ReservationStateMachine
+from supa.connection.fsm import (
+    LifecycleStateMachine,
+    ProvisionStateMachine,
+    ReservationStateMachine,
+    TransitionNotAllowed,
+)
 from supa.db.model import Connection, Path, PathTrace, Reservation, Segment, Topology, connection_to_dict
 from supa.grpc_nsi.connection_requester_pb2 import (
     ErrorRequest,
@@ -10,13 +10,15 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
-from json import dumps, loads
-from time import sleep
-from typing import Any, List
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from json import loads
+from time import monotonic, sleep
+from typing import Any, List, Optional
 from uuid import UUID
 
 from pydantic import BaseSettings
-from requests import get, post
+from requests import Response, Session
 from requests.auth import HTTPBasicAuth
 from requests.exceptions import ConnectionError, HTTPError  # noqa: A004
 from structlog.stdlib import BoundLogger
@@ -26,6 +28,12 @@ from supa.job.shared import NsiException
 from supa.nrm.backend import STP, BaseBackend
 from supa.util.find import find_file
 
+# Maximum number of concurrent requests to the orchestrator when fetching the topology,
+# stays below the default connection pool size of a requests session.
+_MAX_CONCURRENT_REQUESTS = 8
+# Number of seconds before the access token expires that a new one is retrieved.
+_ACCESS_TOKEN_EXPIRY_MARGIN = 30
+
 
 class BackendSettings(BaseSettings):
     """Backend settings with default values.
@@ -52,12 +60,25 @@ class Backend(BaseBackend):
         super(Backend, self).__init__()
         self.backend_settings = BackendSettings(_env_file=(env_file := find_file("surf.env")))
         self.log.info("Read backend properties", path=str(env_file))
+        # reuse connections to the orchestrator and OIDC provider across requests
+        self.session = Session()
+        # cached access token and the monotonic time after which it should be renewed
+        self._access_token = ""
+        self._access_token_expiry = 0.0
+        self.session.hooks["response"].append(self._forget_rejected_access_token)
+
+    def _forget_rejected_access_token(self, response: Response, *args: Any, **kwargs: Any) -> None:
+        """Forget the cached access token when it is rejected, so that a new one is retrieved on the next call."""
+        if response.status_code == 401:
+            self._access_token_expiry = 0.0
 
     def _retrieve_access_token(self) -> str:
         access_token = ""  # noqa: S105
-        if self.backend_settings.oauth2_active:
+        if self.backend_settings.oauth2_active and monotonic() < self._access_token_expiry:
+            access_token = self._access_token
+        elif self.backend_settings.oauth2_active:
             self.log.debug("retrieve access_token")
-            token = post(
+            token = self.session.post(
                 self.backend_settings.oidc_url,
                 auth=HTTPBasicAuth(self.backend_settings.oidc_user, self.backend_settings.oidc_password),
                 headers={"Content-Type": "application/x-www-form-urlencoded"},
@@ -71,7 +92,13 @@ class Backend(BaseBackend):
                         self.log.warning("unable to authenticate", reason=str(http_err))
                         raise NsiException(GenericRmError, str(http_err)) from http_err
                 else:
-                    access_token = token.json()["access_token"]
+                    token_info = token.json()
+                    access_token = token_info["access_token"]
+                    # reuse access token until shortly before it expires, if the OIDC provider tells when it does
+                    self._access_token = access_token
+                    self._access_token_expiry = (
+                        monotonic() + token_info.get("expires_in", 0) - _ACCESS_TOKEN_EXPIRY_MARGIN
+                    )
         self.log.debug("workflow credentials", access_token=access_token, host=self.backend_settings.host)
         return access_token
 
@@ -93,9 +120,9 @@ class Backend(BaseBackend):
                 "speed_policer": True,
             },
         ]
-        self.log.debug("create workflow payload", payload=dumps(json))
+        self.log.debug("create workflow payload", payload=json)
         try:
-            result = post(
+            result = self.session.post(
                 f"{self.backend_settings.host}/api/processes/{self.backend_settings.create_workflow_name}",
                 headers={"Authorization": f"bearer {access_token}", "Content-Type": "application/json"},
                 json=json,
@@ -108,8 +135,9 @@ class Backend(BaseBackend):
                 result.raise_for_status()
             except HTTPError as http_err:
                 if http_err.response.status_code == 400:
-                    self.log.warning("workflow failed", reason=loads(http_err.response.content)["detail"])
-                    raise NsiException(GenericRmError, loads(http_err.response.content)["detail"]) from http_err
+                    detail = loads(http_err.response.content)["detail"]
+                    self.log.warning("workflow failed", reason=detail)
+                    raise NsiException(GenericRmError, detail) from http_err
                 else:
                     self.log.warning("workflow failed", reason=str(http_err))
                     raise NsiException(GenericRmError, str(http_err)) from http_err
@@ -119,7 +147,7 @@ class Backend(BaseBackend):
         self.log.info("start workflow terminate")
         access_token = self._retrieve_access_token()
         try:
-            result = post(
+            result = self.session.post(
                 f"{self.backend_settings.host}/api/processes/{self.backend_settings.terminate_workflow_name}",
                 headers={
                     "Authorization": f"bearer {access_token}",
@@ -143,7 +171,7 @@ class Backend(BaseBackend):
         access_token = self._retrieve_access_token()
         try:
             self.log.debug("adding connection id to note of subscription")
-            result = post(
+            result = self.session.post(
                 f"{self.backend_settings.host}/api/processes/modify_note",
                 headers={
                     "Authorization": f"bearer {access_token}",
@@ -168,17 +196,16 @@ class Backend(BaseBackend):
     def _get_process_info(self, process_id: str) -> Any:
         access_token = self._retrieve_access_token()
         try:
-            process = get(
+            process = self.session.get(
                 f"{self.backend_settings.host}/api/processes/{process_id}",
                 headers={"Authorization": f"bearer {access_token}"},
             )
         except ConnectionError as con_err:
             self.log.warning("cannot get process status", reason=str(con_err))
             raise NsiException(GenericRmError, str(con_err)) from con_err
-        self.log.debug("process status", process_status=process.json()["status"])
         return process.json()
 
-    def _wait_for_completion(self, process_id: str) -> None:
+    def _wait_for_completion(self, process_id: str) -> Any:
         log = self.log.bind(process_id=process_id)
         sleep(1)
         while (info := self._get_process_info(process_id))["status"] == "created" or info["status"] == "running":
@@ -186,22 +213,14 @@ class Backend(BaseBackend):
             sleep(3)
         if info["status"] == "completed":
             log.info("workflow finished", status=info["status"])
+            return info
         else:
             log.warning("workflow process failed", status=info["status"], reason=info["failed_reason"])
             raise NsiException(GenericRmError, info["failed_reason"]) from None
 
-    def _get_subscription_id(self, process_id: str) -> str:
-        access_token = self._retrieve_access_token()
-        process = get(
-            f"{self.backend_settings.host}/api/processes/{process_id}",
-            headers={"Authorization": f"bearer {access_token}"},
-        )
-        self.log.debug("process status", process_status=process.json()["status"])
-        return str(process.json()["current_state"]["subscription"]["subscription_id"])
-
     def _get_nsi_stp_subscriptions(self) -> Any:
         access_token = self._retrieve_access_token()
-        nsi_stp_subscriptions = get(
+        nsi_stp_subscriptions = self.session.get(
             f"{self.backend_settings.host}/api/subscriptions/?filter=status,active,tag,NSISTP-NSISTPNL",
             headers={"Authorization": f"bearer {access_token}"},
         )
@@ -213,41 +232,45 @@ class Backend(BaseBackend):
                 raise NsiException(GenericRmError, str(http_err)) from http_err
         return nsi_stp_subscriptions.json()
 
+    def _get_nsi_stp_domain_model(self, nsi_stp_subscription_id: str, access_token: str) -> Optional[STP]:
+        nsi_stp_dm = self.session.get(
+            f"{self.backend_settings.host}/api/subscriptions/domain-model/{nsi_stp_subscription_id}",
+            headers={"Authorization": f"bearer {access_token}"},
+        )
+        if nsi_stp_dm.status_code != 200:
+            try:
+                nsi_stp_dm.raise_for_status()
+            except HTTPError as http_err:
+                self.log.warning(
+                    "failed to fetch NSISTP domain model",
+                    reason=str(http_err),
+                    nsi_stp_subscription_id=nsi_stp_subscription_id,
+                )
+                raise NsiException(GenericRmError, str(http_err)) from http_err
+            return None
+        nsi_stp_dict = nsi_stp_dm.json()
+        return STP(
+            topology=nsi_stp_dict["settings"]["topology"],
+            stp_id=nsi_stp_dict["settings"]["stp_id"],
+            port_id=nsi_stp_dict["settings"]["sap"]["port"]["owner_subscription_id"],
+            vlans=nsi_stp_dict["settings"]["sap"]["vlanrange"],
+            description=nsi_stp_dict["settings"]["stp_description"],
+            is_alias_in=nsi_stp_dict["settings"]["is_alias_in"],
+            is_alias_out=nsi_stp_dict["settings"]["is_alias_out"],
+            bandwidth=nsi_stp_dict["settings"]["bandwidth"],
+            enabled=nsi_stp_dict["settings"]["expose_in_topology"],
+        )
+
     def _get_topology(self) -> List[STP]:
         self.log.debug("get topology from NRM")
         access_token = self._retrieve_access_token()
-        ports: List[STP] = []
-        for nsi_stp_sub in self._get_nsi_stp_subscriptions():
-            nsi_stp_dm = get(
-                f"{self.backend_settings.host}/api/subscriptions/domain-model/{nsi_stp_sub['subscription_id']}",
-                headers={"Authorization": f"bearer {access_token}"},
+        nsi_stp_subscription_ids = [nsi_stp_sub["subscription_id"] for nsi_stp_sub in self._get_nsi_stp_subscriptions()]
+        # fetch the domain models concurrently instead of one after the other
+        with ThreadPoolExecutor(max_workers=_MAX_CONCURRENT_REQUESTS) as executor:
+            ports = executor.map(
+                partial(self._get_nsi_stp_domain_model, access_token=access_token), nsi_stp_subscription_ids
             )
-            if nsi_stp_dm.status_code != 200:
-                try:
-                    nsi_stp_dm.raise_for_status()
-                except HTTPError as http_err:
-                    self.log.warning(
-                        "failed to fetch NSISTP domain model",
-                        reason=str(http_err),
-                        nsi_stp_subscription_id=nsi_stp_sub["subscription_id"],
-                    )
-                    raise NsiException(GenericRmError, str(http_err)) from http_err
-            else:
-                nsi_stp_dict = nsi_stp_dm.json()
-                ports.append(
-                    STP(
-                        topology=nsi_stp_dict["settings"]["topology"],
-                        stp_id=nsi_stp_dict["settings"]["stp_id"],
-                        port_id=nsi_stp_dict["settings"]["sap"]["port"]["owner_subscription_id"],
-                        vlans=nsi_stp_dict["settings"]["sap"]["vlanrange"],
-                        description=nsi_stp_dict["settings"]["stp_description"],
-                        is_alias_in=nsi_stp_dict["settings"]["is_alias_in"],
-                        is_alias_out=nsi_stp_dict["settings"]["is_alias_out"],
-                        bandwidth=nsi_stp_dict["settings"]["bandwidth"],
-                        enabled=nsi_stp_dict["settings"]["expose_in_topology"],
-                    )
-                )
-        return ports
+            return [port for port in ports if port is not None]
 
     def activate(
         self,
@@ -262,8 +285,9 @@ class Backend(BaseBackend):
         """Activate resources in NRM."""
         self.log: BoundLogger = self.log.bind(primitive="activate", connection_id=str(connection_id))
         process = self._workflow_create(src_port_id, src_vlan, dst_port_id, dst_vlan, bandwidth)
-        self._wait_for_completion(process["id"])
-        subscription_id = self._get_subscription_id(process["id"])
+        # the information of the completed process already holds the subscription ID, no need to fetch it again
+        process_info = self._wait_for_completion(process["id"])
+        subscription_id = str(process_info["current_state"]["subscription"]["subscription_id"])
         self.log = self.log.bind(subscription_id=subscription_id)
         process = self._add_note(connection_id, subscription_id)
         self._wait_for_completion(process["id"])
@@ -169,7 +169,7 @@ def to_schedule(reservation: model.Reservation) -> Schedule:
     """
     pb_s = Schedule()
     pb_s.start_time.FromDatetime(reservation.start_time)
-    if not reservation.end_time == NO_END_DATE:
+    if reservation.end_time != NO_END_DATE:
         pb_s.end_time.FromDatetime(reservation.end_time)
     return pb_s
 
@@ -1,8 +1,11 @@
+import pytest
+
 from supa.connection.fsm import (
     DataPlaneStateMachine,
     LifecycleStateMachine,
     ProvisionStateMachine,
     ReservationStateMachine,
+    TransitionNotAllowed,
 )
 from supa.db.model import Reservation
 
@@ -192,3 +195,12 @@ def test_data_plane_state_machine() -> None:  # noqa: D103
     assert reservation.data_plane_state == DataPlaneStateMachine.Deactivating.value
     dpsm.deactivate_confirm()
     assert reservation.data_plane_state == DataPlaneStateMachine.Deactivated.value
+
+
+def test_transition_not_allowed() -> None:  # noqa: D103
+    reservation = Reservation()
+    rsm = ReservationStateMachine(reservation, state_field="reservation_state")
+    with pytest.raises(TransitionNotAllowed, match="Can't reserve_confirmed when in ReserveStart"):
+        rsm.reserve_confirmed()
+    assert reservation.reservation_state == ReservationStateMachine.ReserveStart.value
+    assert rsm.is_ReserveStart
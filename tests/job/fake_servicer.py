@@ -14,6 +14,7 @@ from supa.grpc_nsi.connection_requester_pb2 import (
     ErrorRequest,
     GenericConfirmedRequest,
     GenericFailedRequest,
+    QueryConfirmedRequest,
     ReserveConfirmedRequest,
     ReserveTimeoutRequest,
 )
@@ -301,3 +302,15 @@ class Servicer(ConnectionRequesterServicer):
         assert test_hit_count == 1
 
         return GenericAcknowledgment(header=request.header)
+
+    def QuerySummaryConfirmed(self, request: QueryConfirmedRequest, context: Any) -> GenericAcknowledgment:
+        """Fake QuerySummaryConfirmed to return mocked GenericAcknowledgment."""
+        assert len(request.reservation) == 1
+
+        return GenericAcknowledgment(header=request.header)
+
+    def QueryRecursiveConfirmed(self, request: QueryConfirmedRequest, context: Any) -> GenericAcknowledgment:
+        """Fake QueryRecursiveConfirmed to return mocked GenericAcknowledgment."""
+        assert len(request.reservation) == 1
+
+        return GenericAcknowledgment(header=request.header)
@@ -0,0 +1,163 @@
+from typing import Any, List, Tuple, Union
+from uuid import uuid4
+
+from sqlalchemy import Column
+
+from supa.db.model import Notification, Result
+from supa.grpc_nsi.connection_provider_pb2 import QueryNotificationRequest, QueryRequest, QueryResultRequest
+from supa.grpc_nsi.connection_requester_pb2 import (
+    DataPlaneStateChangeRequest,
+    ErrorEventRequest,
+    GenericConfirmedRequest,
+)
+from supa.job.query import (
+    QueryRecursiveJob,
+    QuerySummaryJob,
+    create_query_confirmed_request,
+    create_query_notification_confirmed_request,
+    create_query_result_confirmed_request,
+)
+from supa.util.type import NotificationType, ResultType
+
+
+def test_create_query_confirmed_request(connection_id: Column, released: None) -> None:
+    """Test create_query_confirmed_request to return the reservation matching the connection ID."""
+    pb_query_request = QueryRequest()
+    pb_query_request.header.correlation_id = uuid4().urn
+    pb_query_request.connection_id.append(str(connection_id))
+    request = create_query_confirmed_request(pb_query_request)
+    assert request.header == pb_query_request.header
+    assert len(request.reservation) == 1
+    assert request.reservation[0].connection_id == str(connection_id)
+    assert request.reservation[0].notification_id == 0
+    assert request.reservation[0].result_id == 0
+
+
+def test_create_query_confirmed_request_notification_and_result_id(connection_id: Column, released: None) -> None:
+    """Test create_query_confirmed_request to return the highest notification and result ID of the reservation."""
+    from supa.db.session import db_session
+
+    with db_session() as session:
+        for notification_id in (1, 2, 3):
+            session.add(
+                Notification(
+                    connection_id=connection_id,
+                    notification_id=notification_id,
+                    notification_type=NotificationType.ErrorEvent.value,
+                    notification_data=b"",
+                )
+            )
+        for result_id in (1, 2):
+            session.add(
+                Result(
+                    connection_id=connection_id,
+                    correlation_id=uuid4(),
+                    result_id=result_id,
+                    result_type=ResultType.ReserveConfirmed.value,
+                    result_data=b"",
+                )
+            )
+
+    pb_query_request = QueryRequest()
+    pb_query_request.connection_id.append(str(connection_id))
+    request = create_query_confirmed_request(pb_query_request)
+    assert len(request.reservation) == 1
+    assert request.reservation[0].notification_id == 3
+    assert request.reservation[0].result_id == 2
+
+
+def test_create_query_confirmed_request_global_reservation_id(connection_id: Column, released: None) -> None:
+    """Test create_query_confirmed_request to return the reservation matching the global reservation ID."""
+    pb_query_request = QueryRequest()
+    pb_query_request.global_reservation_id.append("global reservation id")
+    request = create_query_confirmed_request(pb_query_request)
+    assert [reservation.connection_id for reservation in request.reservation] == [str(connection_id)]
+
+
+def test_create_query_confirmed_request_without_filter(connection_id: Column, released: None) -> None:
+    """Test create_query_confirmed_request to return all reservations when no filter is specified."""
+    request = create_query_confirmed_request(QueryRequest())
+    assert str(connection_id) in [reservation.connection_id for reservation in request.reservation]
+
+
+def test_create_query_confirmed_request_reserve_checking(connection_id: Column, reserve_checking: None) -> None:
+    """Test create_query_confirmed_request to skip reservations that are still being checked."""
+    pb_query_request = QueryRequest()
+    pb_query_request.connection_id.append(str(connection_id))
+    request = create_query_confirmed_request(pb_query_request)
+    assert len(request.reservation) == 0
+
+
+def test_create_query_notification_confirmed_request(connection_id: Column) -> None:
+    """Test create_query_notification_confirmed_request to return the notifications by type in requested range."""
+    from supa.db.session import db_session
+
+    notifications: List[Tuple[int, NotificationType, Union[ErrorEventRequest, DataPlaneStateChangeRequest]]] = [
+        (1, NotificationType.ErrorEvent, ErrorEventRequest()),
+        (2, NotificationType.DataPlaneStateChange, DataPlaneStateChangeRequest()),
+        (3, NotificationType.ErrorEvent, ErrorEventRequest()),
+    ]
+    with db_session() as session:
+        for notification_id, notification_type, pb_notification in notifications:
+            pb_notification.notification.connection_id = str(connection_id)
+            pb_notification.notification.notification_id = notification_id
+            session.add(
+                Notification(
+                    connection_id=connection_id,
+                    notification_id=notification_id,
+                    notification_type=notification_type.value,
+                    notification_data=pb_notification.SerializeToString(),
+                )
+            )
+
+    pb_query_notification_request = QueryNotificationRequest()
+    pb_query_notification_request.connection_id = str(connection_id)
+    pb_query_notification_request.start_notification_id = 2
+    request = create_query_notification_confirmed_request(pb_query_notification_request)
+    assert [error_event.notification.notification_id for error_event in request.error_event] == [3]
+    assert [dpsc.notification.notification_id for dpsc in request.data_plane_state_change] == [2]
+    assert len(request.reserve_timeout) == 0
+    assert len(request.message_delivery_timeout) == 0
+
+
+def test_create_query_result_confirmed_request(connection_id: Column) -> None:
+    """Test create_query_result_confirmed_request to return the results with their stored message."""
+    from supa.db.session import db_session
+
+    pb_generic_confirmed = GenericConfirmedRequest()
+    pb_generic_confirmed.connection_id = str(connection_id)
+    with db_session() as session:
+        session.add(
+            Result(
+                connection_id=connection_id,
+                correlation_id=uuid4(),
+                result_id=1,
+                result_type=ResultType.ProvisionConfirmed.value,
+                result_data=pb_generic_confirmed.SerializeToString(),
+            )
+        )
+
+    pb_query_result_request = QueryResultRequest()
+    pb_query_result_request.connection_id = str(connection_id)
+    request = create_query_result_confirmed_request(pb_query_result_request)
+    assert len(request.result) == 1
+    assert request.result[0].result_id == 1
+    assert request.result[0].provision_confirmed == pb_generic_confirmed
+
+
+def test_query_summary_job(connection_id: Column, released: None, get_stub: None, caplog: Any) -> None:
+    """Test QuerySummaryJob to send the matching reservation with QuerySummaryConfirmed."""
+    pb_query_request = QueryRequest()
+    pb_query_request.connection_id.append(str(connection_id))
+    QuerySummaryJob(pb_query_request).__call__()
+    assert "Query summary" in caplog.text
+    assert "QuerySummaryConfirmed" in caplog.text
+
+
+def test_query_recursive_job(connection_id: Column, released: None, get_stub: None, caplog: Any) -> None:
+    """Test QueryRecursiveJob to send the matching reservation with QueryRecursiveConfirmed."""
+    pb_query_request = QueryRequest()
+    pb_query_request.connection_id.append(str(connection_id))
+    QueryRecursiveJob(pb_query_request).__call__()
+    assert "Query recursive" in caplog.text
+    assert "QueryRecursiveConfirmed" in caplog.text
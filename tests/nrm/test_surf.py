@@ -0,0 +1,109 @@
+import json
+from typing import Any, List
+
+import pytest
+from requests import PreparedRequest, Response
+from requests.adapters import BaseAdapter
+
+from supa import get_project_root
+
+
+class Clock:
+    """Monotonic clock that only advances when told to."""
+
+    def __init__(self) -> None:
+        """Start the clock at an arbitrary point in time."""
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+class UnauthorizedAdapter(BaseAdapter):
+    """Transport adapter that rejects every request with 401 Unauthorized."""
+
+    def send(self, request: PreparedRequest, *args: Any, **kwargs: Any) -> Response:
+        """Reject the request."""
+        response = Response()
+        response.status_code = 401
+        response.request = request
+        return response
+
+    def close(self) -> None:
+        """Nothing to clean up."""
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    """Replace the monotonic clock used by the SURF backend."""
+    import supa.nrm.backends.surf
+
+    clock = Clock()
+    monkeypatch.setattr(supa.nrm.backends.surf, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def backend(monkeypatch: pytest.MonkeyPatch, clock: Clock) -> Any:
+    """SURF backend with OAuth2 enabled, with the backends directory on sys.path like init_app does."""
+    monkeypatch.syspath_prepend(str(get_project_root() / "src" / "supa" / "nrm" / "backends"))
+    from supa.nrm.backends.surf import Backend
+
+    backend = Backend()
+    backend.backend_settings.oauth2_active = True
+    return backend
+
+
+def token_endpoint(backend: Any, monkeypatch: pytest.MonkeyPatch, **token_info: Any) -> List[str]:
+    """Mock the OIDC token endpoint to hand out numbered access tokens, return the list of tokens handed out."""
+    tokens: List[str] = []
+
+    def post(*args: Any, **kwargs: Any) -> Response:
+        tokens.append(f"token{len(tokens) + 1}")
+        response = Response()
+        response.status_code = 200
+        response._content = json.dumps({"access_token": tokens[-1], **token_info}).encode()
+        return response
+
+    monkeypatch.setattr(backend.session, "post", post)
+    return tokens
+
+
+def test_access_token_reused_before_expiry(backend: Any, clock: Clock, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the access token to be reused until shortly before it expires."""
+    tokens = token_endpoint(backend, monkeypatch, expires_in=300)
+    assert backend._retrieve_access_token() == "token1"
+    clock.now += 269
+    assert backend._retrieve_access_token() == "token1"
+    assert tokens == ["token1"]
+
+
+def test_access_token_refreshed_after_expiry(backend: Any, clock: Clock, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test a new access token to be retrieved once the cached one is within the expiry margin."""
+    tokens = token_endpoint(backend, monkeypatch, expires_in=300)
+    assert backend._retrieve_access_token() == "token1"
+    clock.now += 270
+    assert backend._retrieve_access_token() == "token2"
+    clock.now += 1
+    assert backend._retrieve_access_token() == "token2"
+    assert tokens == ["token1", "token2"]
+
+
+@pytest.mark.parametrize("token_info", [{}, {"expires_in": 20}])
+def test_access_token_not_cached(backend: Any, monkeypatch: pytest.MonkeyPatch, token_info: Any) -> None:
+    """Test the access token not to be cached when expires_in is missing or shorter than the expiry margin."""
+    tokens = token_endpoint(backend, monkeypatch, **token_info)
+    assert backend._retrieve_access_token() == "token1"
+    assert backend._retrieve_access_token() == "token2"
+    assert tokens == ["token1", "token2"]
+
+
+def test_access_token_forgotten_on_unauthorized(backend: Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the cached access token to be replaced after the orchestrator rejected it with 401 Unauthorized."""
+    tokens = token_endpoint(backend, monkeypatch, expires_in=300)
+    assert backend._retrieve_access_token() == "token1"
+    backend.session.mount("http://", UnauthorizedAdapter())
+    assert backend.session.get("http://orchestrator/api/processes/1").status_code == 401
+    assert backend._retrieve_access_token() == "token2"
+    assert tokens == ["token1", "token2"]